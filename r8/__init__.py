@@ -4,11 +4,14 @@ The public API of r8 that is exposed to challenges.
 import sqlite3
 from typing import Any
 
+import aiosqlite
+
 from r8 import util
 from r8.challenge import Challenge, challenges
 from r8.util import echo, log
 
 db: sqlite3.Connection
+db_async: aiosqlite.Connection
 settings: dict[str, Any] = {}
 
 __all__ = ["Challenge", "challenges", "db", "util", "log", "echo"]
@@ -29,7 +29,7 @@ class FromFolder(r8.Challenge):
         self.echo(f"Created {len(flags)} flags.")
 
     async def description(self, user: str, solved: bool):
-        desc = self.path / r8.util.get_team(user) / "description.html"
+        desc = self.path / await r8.util.get_team_async(user) / "description.html"
         try:
             return desc.read_text()
         except IOError:
@@ -31,7 +31,8 @@ def min_distinguishable_column_width(elements: list[str]) -> int:
 
 def format_untrusted_col(data: Optional[str], width: int) -> str:
     if data:
-        data = r8.util.console_escape(data)[:width]
+        # console_escape maps characters 1:1, so we can truncate first.
+        data = r8.util.console_escape(data[:width])
     else:
         data = "-"
     data = data
@@ -80,6 +80,7 @@ def init(origin, static_dir, host, port, database) -> None:
             value TEXT NOT NULL
         );
     """)
+    util.create_indexes(conn)
     conn.executemany(
         "INSERT INTO settings (key, value) VALUES (?,?)",
         [(k, json.dumps(v)) for k, v in [
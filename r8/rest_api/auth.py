@@ -1,7 +1,6 @@
 from functools import wraps
 from typing import Any, Callable
 
-import argon2
 import itsdangerous
 from aiohttp import web
 
@@ -39,8 +38,10 @@ async def register(request: web.Request):
         password = logindata["password"]
         nickname = logindata["nickname"]
     except KeyError:
-        r8.log(request, "register-invalid", "incomplete request")
+        await r8.util.log_async(request, "register-invalid", "incomplete request")
         return web.HTTPBadRequest(reason="All fields are required.")
+    password_hash = await r8.util.hash_password_async(password)
+    # No await between the checks and the inserts, so that concurrent registrations cannot interleave.
     with r8.db:
         user_exists = r8.db.execute(
             "SELECT 1 FROM users WHERE uid = ?",
@@ -50,22 +51,22 @@ async def register(request: web.Request):
             "SELECT 1 FROM teams WHERE tid = ?",
             (nickname,)
         ).fetchone()
+        if not user_exists and not team_exists:
+            r8.db.execute(
+                "INSERT INTO users(uid, password) VALUES (?,?)",
+                (user, password_hash)
+            )
+            r8.db.execute(
+                "INSERT INTO teams(uid, tid) VALUES (?,?)",
+                (user, nickname)
+            )
     if user_exists:
-        r8.log(request, "register-invalid", "username exists")
+        await r8.util.log_async(request, "register-invalid", "username exists")
         return web.HTTPBadRequest(reason="There already exists an account with this email.")
     if team_exists:
-        r8.log(request, "register-invalid", "team exists")
+        await r8.util.log_async(request, "register-invalid", "team exists")
         return web.HTTPBadRequest(reason="There already exists a team with that name.")
-    with r8.db:
-        r8.db.execute(
-            "INSERT INTO users(uid, password) VALUES (?,?)",
-            (user, r8.util.hash_password(password))
-        )
-        r8.db.execute(
-            "INSERT INTO teams(uid, tid) VALUES (?,?)",
-            (user, nickname)
-        )
-    r8.log(request, "register-success", uid=user)
+    await r8.util.log_async(request, "register-success", uid=user)
     return await login(request)
 
 
@@ -76,7 +77,7 @@ async def login(request: web.Request):
         user = logindata["username"]
         password = logindata["password"]
     except KeyError:
-        r8.log(request, "login-invalid")
+        await r8.util.log_async(request, "login-invalid")
         return web.HTTPBadRequest(reason="username or password missing.")
     with r8.db:
         ok = r8.db.execute(
@@ -84,11 +85,10 @@ async def login(request: web.Request):
             (user,)
         ).fetchone()
     try:
-        if not ok:
+        if not await r8.util.verify_hash_async(ok[0] if ok else None, password):
             raise ValueError()
-        r8.util.verify_hash(ok[0], password)
-        r8.log(request, "login-success", uid=user)
-        token = r8.util.auth_sign.sign(user.encode()).decode()
+        await r8.util.log_async(request, "login-success", uid=user)
+        token = r8.util.auth_token(user)
         is_secure = not r8.settings["origin"].startswith("http://")
         resp = web.json_response({})
         resp.set_cookie(
@@ -100,8 +100,8 @@ async def login(request: web.Request):
             secure=is_secure,
         )
         return resp
-    except (argon2.exceptions.VerificationError, ValueError):
-        r8.log(request, "login-fail", user, uid=user if ok else None)
+    except ValueError:
+        await r8.util.log_async(request, "login-fail", user, uid=user if ok else None)
         return web.HTTPUnauthorized(
             reason="Invalid credentials."
         )
@@ -12,11 +12,11 @@ routes = web.RouteTableDef()
 @authenticated
 async def get_challenges(user: str, request: web.Request):
     """Get the current challenge state."""
-    r8.log(request, "get-challenges", request.headers.get("User-Agent"), uid=user)
+    await r8.util.log_async(request, "get-challenges", request.headers.get("User-Agent"), uid=user)
     challenges = await r8.util.get_challenges(user)
     return web.json_response({
         "user": user,
-        "team": r8.util.get_team(user),
+        "team": await r8.util.get_team_async(user),
         "challenges": challenges,
     })
 
@@ -27,7 +27,7 @@ async def submit_flag(user: str, request: web.Request):
     """Submit a flag."""
     flag = (await request.json()).get("flag", "")
     try:
-        cid = r8.util.submit_flag(flag, user, request)
+        cid = await r8.util.submit_flag_async(flag, user, request)
     except ValueError as e:
         return web.HTTPBadRequest(reason=str(e))
     else:
@@ -57,18 +57,16 @@ async def handle_challenge_request(user: str, request: web.Request):
             text = urllib.parse.unquote(text)
         data = path + text
         # We want this to appear before any challenge-specific logging...
-        rowid = r8.log(request, "handle-request", data, uid=user, cid=inst.id)
+        rowid = await r8.util.log_async(request, "handle-request", data, uid=user, cid=inst.id)
         try:
             resp = await inst.handle_post_request(user, request)
             if isinstance(resp, str):
                 resp = web.json_response({"message": resp})
-            with r8.db:
-                r8.db.execute("""UPDATE events SET data = ? WHERE ROWID = ?""",
-                              (f"{data} -> {resp.status} {resp.reason}", rowid))
+            await r8.db_async.execute("""UPDATE events SET data = ? WHERE ROWID = ?""",
+                                      (f"{data} -> {resp.status} {resp.reason}", rowid))
         except Exception as e:
-            with r8.db:
-                r8.db.execute("""UPDATE events SET data = ? WHERE ROWID = ?""",
-                              (f"{data} -> {e}", rowid))
+            await r8.db_async.execute("""UPDATE events SET data = ? WHERE ROWID = ?""",
+                                      (f"{data} -> {e}", rowid))
             raise
 
     return resp
@@ -10,9 +10,12 @@ from ..scoring import Scoreboard
 
 scoreboards: list[Scoreboard] = [Scoreboard()]
 ws_connections: set[web.WebSocketResponse] = set()
+solve_lock: asyncio.Lock
 
 
 async def on_startup(app):
+    global solve_lock
+    solve_lock = asyncio.Lock()
     scoreboards[0].timestamp = r8.settings.get("start", time.time())
     with r8.db:
         submissions = r8.db.execute("""
@@ -35,12 +38,19 @@ async def on_startup(app):
 
 
 def on_solve(sender, user, cid):
-    team = r8.util.get_team(user)
-    if team.startswith("_"):
-        return
-    scoreboards.append(scoreboards[-1].solve(team, r8.challenges[cid], time.time()))
+    # signal receivers are synchronous, so we look up the team in a task.
+    asyncio.create_task(record_solve(user, cid, time.time()))
+
+
+async def record_solve(user: str, cid: str, timestamp: float) -> None:
+    # tasks acquire the lock in the order they were created, which keeps the scoreboards in submission order.
+    async with solve_lock:
+        team = await r8.util.get_team_async(user)
+        if team.startswith("_"):
+            return
+        scoreboards.append(scoreboards[-1].solve(team, r8.challenges[cid], timestamp))
+        data = scoreboards[-1].to_json()
 
-    data = scoreboards[-1].to_json()
     for ws in ws_connections:
         asyncio.create_task(send_task(ws, data))
 
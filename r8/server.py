@@ -20,8 +20,23 @@ async def serve_static(request: web.Request):
     return r8.util.serve_static(r8.settings["static_dir"], request.match_info["path"])
 
 
+async def on_startup(app):
+    r8.util.create_indexes(r8.db)
+    filename = r8.db.execute("PRAGMA database_list").fetchone()[2]
+    r8.db_async = await r8.util.aiosqlite_connect(filename)
+    await r8.util.open_read_pool(filename)
+    await r8.util.init_dummy_hash()
+
+
+async def on_cleanup(app):
+    await r8.util.close_read_pool()
+    await r8.db_async.close()
+
+
 def make_app() -> web.Application:
     app = web.Application()
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
     aiohttp_jinja2.setup(app, loader=jinja2.FileSystemLoader(r8.settings["static_dir"]))
     app.add_subapp("/api/", rest_api.make_app())
     app.router.add_get('/{filename:(\\w+\\.html)?}', render_template)
@@ -1,19 +1,24 @@
 import asyncio
-import datetime
+import concurrent.futures
+import contextlib
 import functools
 import html
+import itertools
 import json
+import os
 import re
 import secrets
 import shutil
 import sqlite3
 import textwrap
+import time
 import traceback
-from collections.abc import Iterable
+from collections.abc import AsyncIterator, Iterable
 from functools import wraps
 from pathlib import Path
 from typing import Optional, TypeVar, Union
 
+import aiosqlite
 import argon2
 import blinker
 import click
@@ -25,49 +30,87 @@ import r8
 from r8 import scoring
 
 
+_get_team_query = "SELECT tid FROM teams WHERE uid = ?"
+
+
 def get_team(user: str) -> Optional[str]:
     """Get a given user's team."""
     with r8.db:
-        row = r8.db.execute("""SELECT tid FROM teams WHERE uid = ?""", (user,)).fetchone()
+        row = r8.db.execute(_get_team_query, (user,)).fetchone()
         if row:
             return row[0]
         return None
 
 
+async def get_team_async(user: str) -> Optional[str]:
+    """Like :func:`get_team`, but does not block the event loop."""
+    async with read_connection() as db, db.execute(_get_team_query, (user,)) as cursor:
+        row = await cursor.fetchone()
+    if row:
+        return row[0]
+    return None
+
+
+_get_teams_query = "SELECT DISTINCT tid FROM teams"
+
+
 def get_teams() -> list[str]:
     """Get a list of all teams"""
     with r8.db:
         return [
             x[0] for x in
-            r8.db.execute("SELECT DISTINCT tid FROM teams").fetchall()
+            r8.db.execute(_get_teams_query).fetchall()
         ]
 
 
+_get_users_query = "SELECT uid FROM users"
+
+
 def get_users() -> list[str]:
     """Get a list of all teams"""
     with r8.db:
         return [
             x[0] for x in
-            r8.db.execute("SELECT uid FROM users").fetchall()
+            r8.db.execute(_get_users_query).fetchall()
         ]
 
 
+_has_solved_query = """
+    WITH teammates(uid) AS (
+        SELECT uid FROM teams WHERE tid = (SELECT tid FROM teams WHERE uid = ?)
+    )
+    SELECT COUNT(*)
+    FROM challenges
+    NATURAL JOIN flags
+    INNER JOIN submissions ON (
+        flags.fid = submissions.fid
+        AND (
+            submissions.uid = ? OR
+            team = 1 AND submissions.uid IN teammates
+        )
+    )
+    WHERE challenges.cid = ?
+"""
+
+
 def has_solved(user: str, challenge: str) -> bool:
     """Check if a user has solved a challenge."""
     with r8.db:
-        return r8.db.execute("""
-            SELECT COUNT(*)
-            FROM challenges
-            NATURAL JOIN flags
-            INNER JOIN submissions ON (
-                flags.fid = submissions.fid
-                AND (
-                    submissions.uid = ? OR
-                    team = 1 AND submissions.uid IN (SELECT uid FROM teams WHERE tid = (SELECT tid FROM teams WHERE uid = ?))
-                )
-            )
-            WHERE challenges.cid = ?
-        """, (user, user, challenge)).fetchone()[0]
+        return r8.db.execute(_has_solved_query, (user, user, challenge)).fetchone()[0]
+
+
+async def has_solved_async(user: str, challenge: str) -> bool:
+    """Like :func:`has_solved`, but does not block the event loop."""
+    async with read_connection() as db, db.execute(_has_solved_query, (user, user, challenge)) as cursor:
+        return (await cursor.fetchone())[0]
+
+
+_media_template = textwrap.dedent("""
+    <div class="media">
+        <img class="mr-3" style="max-width: 128px; max-height: 128px;" src="{src}">
+        <div class="align-self-center media-body">{desc}</div>
+    </div>
+    """)
 
 
 def media(src: Optional[str], desc: str, visible: bool = True):
@@ -79,19 +122,20 @@ def media(src: Optional[str], desc: str, visible: bool = True):
         desc: Media body.
         visible: If `False`, a generic challenge icon will be shown instead.
     """
-    return textwrap.dedent(f"""
-        <div class="media">
-            <img class="mr-3" style="max-width: 128px; max-height: 128px;" src="{src if src and visible else "/challenge.svg"}">
-            <div class="align-self-center media-body">{desc}</div>
-        </div>
-        """)
+    return _media_template.format(
+        src=src if src and visible else "/challenge.svg",
+        desc=desc,
+    )
+
+
+_spoiler_ids = itertools.count()
 
 
 def spoiler(help_text: str, button_text="🕵️ Show Hint") -> str:
     """
     HTML boilerplate for spoiler element in challenge descriptions.
     """
-    div_id = secrets.token_hex(5)
+    div_id = f"sp{next(_spoiler_ids):x}"
     return f"""
             <div>
             <div id="{div_id}-help" class="d-none">
@@ -109,6 +153,7 @@ def spoiler(help_text: str, button_text="🕵️ Show Hint") -> str:
             """
 
 
+@functools.lru_cache(maxsize=512)
 def challenge_form_js(cid: str) -> str:
     """
     JS Boilerplate for simple interactive form submissions in the challenge description.
@@ -145,6 +190,7 @@ def challenge_form_js(cid: str) -> str:
     """ % cid
 
 
+@functools.lru_cache(maxsize=512)
 def challenge_invoke_button(cid: str, button_text: str) -> str:
     """
     "Trigger" button for challenges. Clicking it invokes the challenge's HTTP POST handler.
@@ -164,15 +210,16 @@ def url_for(path: str, absolute: bool = False, user: Optional[str] = None) -> st
     If absolute is true, construct an absolute URL including the origin.
     If user is passed, add an authentication token to the URL.
     """
+    return _url_for(path, r8.settings['origin'] if absolute else None, user)
+
+
+@functools.lru_cache(maxsize=8192)
+def _url_for(path: str, origin: Optional[str], user: Optional[str]) -> str:
     if user:
-        token = r8.util.auth_sign.sign(user.encode()).decode()
-        if "?" in path:
-            path += f"&token={token}"
-        else:
-            path += f"?token={token}"
-    if absolute:
-        path = path.lstrip("/")
-        path = f"{r8.settings['origin']}/{path}"
+        sep = "&" if "?" in path else "?"
+        path = f"{path}{sep}token={auth_token(user)}"
+    if origin is not None:
+        path = f"{origin}/{path.lstrip('/')}"
     return path
 
 
@@ -180,7 +227,12 @@ def get_host() -> str:
     """
     Return the hostname of the CTF system.
     """
-    scheme, host, *_ = r8.settings['origin'].split(":")
+    return _parse_host(r8.settings['origin'])
+
+
+@functools.lru_cache(maxsize=1)
+def _parse_host(origin: str) -> str:
+    scheme, host, *_ = origin.split(":")
     return host.lstrip("/")
 
 
@@ -252,11 +304,16 @@ def echo(namespace: str, message: str, err: bool = False) -> None:
 
     For quick and dirty challenge development, it is completely okay to just `print()` instead.
     """
+    click.echo(_echo_prefix(namespace, err) + message, err=err)
+
+
+@functools.cache
+def _echo_prefix(namespace: str, err: bool) -> str:
     if err:
         color = "red"
     else:
-        color = _colors[hash(str) % len(_colors)]
-    click.echo(click.style(f"[{namespace}] ", fg=color) + message, err=err)
+        color = _colors[hash(namespace) % len(_colors)]
+    return click.style(f"[{namespace}] ", fg=color)
 
 
 THasIP = TypeVar("THasIP", str, tuple, asyncio.StreamWriter, asyncio.BaseTransport, web.Request)
@@ -277,6 +334,9 @@ def get_ip(ip: THasIP) -> str:
     return ip
 
 
+_insert_event_query = "INSERT INTO events (ip, type, data, cid, uid) VALUES (?, ?, ?, ?, ?)"
+
+
 def log(
         ip: THasIP,
         type: str,
@@ -295,14 +355,43 @@ def log(
         cid: Challenge this log entry relates to.
         uid: User this log entry relates to.
     """
+    with r8.db:
+        return _log(r8.db, ip, type, data, cid=cid, uid=uid)
+
+
+def _log(
+        db: sqlite3.Connection,
+        ip: THasIP,
+        type: str,
+        data: Optional[str] = None,
+        *,
+        cid: Optional[str] = None,
+        uid: Optional[str] = None,
+) -> int:
+    """Like :func:`log`, but on the given connection and within its current transaction."""
     ip = get_ip(ip)
     if data:
         data = data[:1024]
-    with r8.db:
-        return r8.db.execute(
-            "INSERT INTO events (ip, type, data, cid, uid) VALUES (?, ?, ?, ?, ?)",
-            (ip, type, data, cid, uid)
-        ).lastrowid
+    return db.execute(_insert_event_query, (ip, type, data, cid, uid)).lastrowid
+
+
+async def log_async(
+        ip: THasIP,
+        type: str,
+        data: Optional[str] = None,
+        *,
+        cid: Optional[str] = None,
+        uid: Optional[str] = None,
+) -> int:
+    """Like :func:`log`, but does not block the event loop."""
+    ip = get_ip(ip)
+    if data:
+        data = data[:1024]
+    async with r8.db_async.execute(_insert_event_query, (ip, type, data, cid, uid)) as cursor:
+        return cursor.lastrowid
+
+
+_insert_flag_query = "INSERT OR REPLACE INTO flags (fid, cid, max_submissions) VALUES (?,?,?)"
 
 
 def create_flag(
@@ -322,10 +411,7 @@ def create_flag(
     if flag is None:
         flag = "__flag__{" + secrets.token_hex(16) + "}"
     with r8.db:
-        r8.db.execute(
-            "INSERT OR REPLACE INTO flags (fid, cid, max_submissions) VALUES (?,?,?)",
-            (flag, challenge, max_submissions)
-        )
+        r8.db.execute(_insert_flag_query, (flag, challenge, max_submissions))
     return flag
 
 
@@ -356,6 +442,12 @@ class Signer:
 
 auth_sign = Signer("auth")
 
+
+@functools.lru_cache(maxsize=4096)
+def auth_token(user: str) -> str:
+    """Authentication token for a user. Signing is deterministic, so we can cache tokens."""
+    return auth_sign.sign(user.encode()).decode()
+
 database_rows = click.option(
     '--rows',
     type=int,
@@ -401,24 +493,96 @@ def backup_db(f):
         if backup:
             backup_dir = Path.home() / ".r8"
             backup_dir.mkdir(exist_ok=True)
-            time = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
-            with open(backup_dir / f"backup-{time}.sql", 'w', encoding="utf8") as out:
-                for line in r8.db.iterdump():
-                    out.write('%s\n' % line)
+            timestamp = time.strftime("%Y%m%d-%H%M%S")
+            # Copy database pages directly instead of going through a text dump.
+            with contextlib.closing(sqlite3.connect(backup_dir / f"backup-{timestamp}.db")) as out:
+                r8.db.backup(out)
         return f(**kwds)
 
     return wrapper
 
 
+_pragmas = [
+    "PRAGMA foreign_keys = ON",
+    # WAL lets readers proceed while we write, and synchronous=NORMAL is safe in WAL mode
+    # while avoiding an fsync on every commit.
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA mmap_size = 268435456",
+]
+
+
+_indexes = """
+    CREATE INDEX IF NOT EXISTS teams_tid ON teams(tid);
+    CREATE INDEX IF NOT EXISTS submissions_fid ON submissions(fid);
+"""
+
+
+def create_indexes(db: sqlite3.Connection) -> None:
+    """
+    Create indexes for common lookups. Safe to call repeatedly, so that databases
+    created by older versions of r8 are migrated on startup.
+    """
+    db.executescript(_indexes)
+
+
 def sqlite3_connect(filename):
     """
     Wrapper around sqlite3.connect that enables convenience features.
     """
     db = sqlite3.connect(filename, 10)
-    db.execute("PRAGMA foreign_keys = ON")
+    for pragma in _pragmas:
+        db.execute(pragma)
     return db
 
 
+async def aiosqlite_connect(filename, **kwargs) -> aiosqlite.Connection:
+    """
+    Async equivalent of :func:`sqlite3_connect`.
+
+    The connection runs in autocommit mode so that we never hold a write lock across an `await`,
+    which would block the synchronous `r8.db` connection on the event loop thread.
+    """
+    db = await aiosqlite.connect(filename, timeout=10, isolation_level=None, **kwargs)
+    for pragma in _pragmas:
+        await db.execute(pragma)
+    return db
+
+
+_read_pool: asyncio.Queue[aiosqlite.Connection]
+
+
+async def open_read_pool(filename, size: int = 4) -> None:
+    """
+    Open a pool of read-only connections for :func:`read_connection`.
+    All writes go through `r8.db_async`, WAL mode allows the readers to run concurrently.
+    """
+    global _read_pool
+    _read_pool = asyncio.Queue(maxsize=size)
+    uri = f"{Path(filename).resolve().as_uri()}?mode=ro"
+    for _ in range(size):
+        _read_pool.put_nowait(await aiosqlite_connect(uri, uri=True))
+
+
+async def close_read_pool() -> None:
+    """Close all connections opened by :func:`open_read_pool`, waiting for borrowed ones to be returned."""
+    for _ in range(_read_pool.maxsize):
+        db = await _read_pool.get()
+        await db.close()
+
+
+@contextlib.asynccontextmanager
+async def read_connection() -> AsyncIterator[aiosqlite.Connection]:
+    """Borrow a read-only connection from the pool."""
+    db = await _read_pool.get()
+    try:
+        yield db
+    finally:
+        _read_pool.put_nowait(db)
+
+
 def run_sql(query: str, parameters=None, *, rows: int = 10) -> None:
     """
     Run SQL query against the database and pretty-print the result.
@@ -430,29 +594,72 @@ def run_sql(query: str, parameters=None, *, rows: int = 10) -> None:
             r8.db.rollback()
             return click.secho(str(e), fg="red")
         data = cursor.fetchmany(rows + 1)
-    table = texttable.Texttable(shutil.get_terminal_size((0, 0))[0])
+    if not cursor.description:
+        return print("Statement did not return data.")
+    table = texttable.Texttable(_terminal_width())
     if data:
         table.set_cols_align(["r" if isinstance(x, int) else "l" for x in data[0]])
-    if cursor.description:
-        table.set_deco(table.BORDER | table.HEADER | table.VLINES)
-        header = [x[0] for x in cursor.description]
-        table.add_rows([header] + data[:rows])
-        print(table.draw())
-        if len(data) > rows:
-            click.secho(f"(only first {rows} rows shown)", fg="yellow")
-    else:
-        print("Statement did not return data.")
-
-
-ph = argon2.PasswordHasher()
+    table.set_deco(table.BORDER | table.HEADER | table.VLINES)
+    header = [x[0] for x in cursor.description]
+    table.add_rows([header] + data[:rows])
+    print(table.draw())
+    if len(data) > rows:
+        click.secho(f"(only first {rows} rows shown)", fg="yellow")
+
+
+@functools.cache
+def _terminal_width() -> int:
+    return shutil.get_terminal_size((0, 0))[0]
+
+
+# Argon2 parameters should be tuned to the deployment:
+# Too low makes hashes weak, too high stalls logins for seconds.
+# The fallbacks are argon2-cffi's defaults, which r8 used before the parameters were configurable.
+ph = argon2.PasswordHasher(
+    time_cost=int(os.getenv("R8_ARGON2_T", "2")),
+    memory_cost=int(os.getenv("R8_ARGON2_M", "102400")),
+    parallelism=int(os.getenv("R8_ARGON2_P", "8")),
+)
+# argon2-cffi releases the GIL while hashing, so a thread per core lets logins scale with cores.
+_argon2_pool = concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="argon2")
 
 
 def hash_password(s: str) -> str:
     return ph.hash(s)
 
 
-def verify_hash(hash: str, password: str) -> bool:
-    return ph.verify(hash, password)
+async def hash_password_async(s: str) -> str:
+    """Like :func:`hash_password`, but runs in a worker thread so that it does not block the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(_argon2_pool, hash_password, s)
+
+
+@functools.cache
+def _dummy_hash() -> str:
+    return ph.hash(secrets.token_hex(16))
+
+
+async def init_dummy_hash() -> None:
+    """
+    Create the dummy hash used by :func:`verify_hash` for unknown users in a worker thread,
+    so that no login request pays for it.
+    """
+    await asyncio.get_running_loop().run_in_executor(_argon2_pool, _dummy_hash)
+
+
+def verify_hash(hash: Optional[str], password: str) -> bool:
+    """
+    Check a password against a hash. If no hash is given (e.g. because the user does not exist),
+    we verify against a dummy hash instead so that timing does not reveal which usernames exist.
+    """
+    try:
+        return ph.verify(hash or _dummy_hash(), password) and bool(hash)
+    except argon2.exceptions.VerificationError:
+        return False
+
+
+async def verify_hash_async(hash: Optional[str], password: str) -> bool:
+    """Like :func:`verify_hash`, but runs in a worker thread so that it does not block the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(_argon2_pool, verify_hash, hash, password)
 
 
 _control_char_trans = {
@@ -467,12 +674,16 @@ def console_escape(text: str):
     return text.translate(_control_char_trans)
 
 
+_flag_pattern = re.compile(r"[0-9a-f]{32}")
+_flag_trans = str.maketrans({" ": None, **{c: c.lower() for c in "ABCDEF"}})
+
+
 def correct_flag(flag: str) -> str:
     """
     Fixup slightly misformatted flag input.
     """
-    filtered = flag.replace(" ", "").lower()
-    match = re.search(r"[0-9a-f]{32}", filtered)
+    filtered = flag.translate(_flag_trans)
+    match = _flag_pattern.search(filtered)
     if match:
         return "__flag__{" + match.group(0) + "}"
     return flag
@@ -481,6 +692,94 @@ def correct_flag(flag: str) -> str:
 on_submit = blinker.Signal()
 
 
+_submission_state_query = """
+  WITH teammates(uid) AS (
+    SELECT uid FROM teams WHERE tid = (SELECT tid FROM teams WHERE uid = :user)
+  )
+  SELECT
+    (SELECT 1 FROM users WHERE uid = :user) AS user_exists,
+    flags.fid,
+    challenges.cid,
+    datetime('now') BETWEEN t_start AND t_stop AS is_active,
+    (
+      SELECT COUNT(*) FROM submissions
+      INNER JOIN flags AS f ON f.fid = submissions.fid
+      WHERE f.cid = challenges.cid AND (
+      submissions.uid = :user OR
+      challenges.team = 1 AND submissions.uid IN teammates
+      )
+    ) AS is_already_submitted,
+    (SELECT COUNT(*) FROM submissions WHERE submissions.fid = flags.fid) >= max_submissions AS is_oversubscribed
+  FROM (SELECT 1)
+  LEFT JOIN flags ON flags.fid = :flag OR flags.fid = :corrected_flag
+  LEFT JOIN challenges ON challenges.cid = flags.cid
+"""
+_insert_submission_query = "INSERT INTO submissions (uid, fid) VALUES (?, ?)"
+
+
+def _check_submission(state: tuple, force: bool) -> Optional[tuple[str, str]]:
+    """
+    Decide whether a submission is valid, given a row of `_submission_state_query`.
+
+    Returns:
+        `None` if the flag can be submitted, an `(event type, error message)` tuple otherwise.
+    """
+    user_exists, fid, cid, is_active, is_already_submitted, is_oversubscribed = state
+    if not user_exists:
+        return "flag-err-unknown", "Unknown user."
+    if not cid:
+        return "flag-err-unknown", "Unknown Flag ¯\\_(ツ)_/¯"
+    if not is_active and not force:
+        return "flag-err-inactive", "Challenge is not active."
+    if is_already_submitted:
+        return "flag-err-solved", "Challenge already solved."
+    if is_oversubscribed and not force:
+        return "flag-err-used", "Flag already used too often."
+    return None
+
+
+def _submission_log_args(state: tuple, flag: str, user: str) -> tuple[Optional[str], str, Optional[str]]:
+    """
+    Get the `(uid, flag, cid)` to log for a submission.
+    We only attribute events to users that exist, and log the matched flag rather than the raw input.
+    """
+    user_exists, fid, cid, *_ = state
+    if not user_exists:
+        return None, flag, None
+    return user, fid or flag, cid
+
+
+def _submit_flag(
+        db: sqlite3.Connection,
+        flag: str,
+        user: str,
+        ip: str,
+        force: bool
+) -> tuple[Optional[str], Optional[str]]:
+    """
+    Check and record a flag submission and its event in a single transaction on the given connection.
+
+    Returns:
+        A `(cid, error message)` tuple. The error message is `None` if the flag was accepted.
+    """
+    with db:
+        # Take the write lock upfront so that no other connection can submit in between our checks and the insert.
+        db.execute("BEGIN IMMEDIATE")
+        state = db.execute(
+            _submission_state_query,
+            {"user": user, "flag": flag, "corrected_flag": correct_flag(flag)}
+        ).fetchone()
+        uid, flag, cid = _submission_log_args(state, flag, user)
+        if error := _check_submission(state, force):
+            type, message = error
+            _log(db, ip, type, flag, uid=uid, cid=cid)
+            return cid, message
+
+        db.execute(_insert_submission_query, (user, flag))
+        _log(db, ip, "flag-submit", flag, uid=user, cid=cid)
+    return cid, None
+
+
 def submit_flag(
         flag: str,
         user: str,
@@ -493,114 +792,85 @@ def submit_flag(
     Raises:
         ValueError, if there is an input error.
     """
-    with r8.db:
-        user_exists = r8.db.execute("""
-          SELECT 1 FROM users
-          WHERE uid = ?
-        """, (user,)).fetchone()
-        if not user_exists:
-            r8.log(ip, "flag-err-unknown", flag)
-            raise ValueError("Unknown user.")
-
-        flag, cid = (r8.db.execute("""
-          SELECT fid, cid FROM flags
-          NATURAL INNER JOIN challenges
-          WHERE fid = ? OR fid = ?
-        """, (flag, correct_flag(flag))).fetchone() or [flag, None])
-        if not cid:
-            r8.log(ip, "flag-err-unknown", flag, uid=user)
-            raise ValueError("Unknown Flag ¯\\_(ツ)_/¯")
-
-        is_active = r8.db.execute("""
-          SELECT 1 FROM challenges
-          WHERE cid = ? 
-          AND datetime('now') BETWEEN t_start AND t_stop
-        """, (cid,)).fetchone()
-        if not is_active and not force:
-            r8.log(ip, "flag-err-inactive", flag, uid=user, cid=cid)
-            raise ValueError("Challenge is not active.")
-
-        is_already_submitted = r8.db.execute("""
-          SELECT COUNT(*) FROM submissions 
-          NATURAL INNER JOIN flags
-          NATURAL INNER JOIN challenges
-          WHERE cid = ? AND (
-          uid = ? OR
-          challenges.team = 1 AND submissions.uid IN (SELECT uid FROM teams WHERE tid = (SELECT tid FROM teams WHERE uid = ?))
-          )
-        """, (cid, user, user)).fetchone()[0]
-        if is_already_submitted:
-            r8.log(ip, "flag-err-solved", flag, uid=user, cid=cid)
-            raise ValueError("Challenge already solved.")
-
-        is_oversubscribed = r8.db.execute("""
-          SELECT 1 FROM flags
-          WHERE fid = ?
-          AND (SELECT COUNT(*) FROM submissions WHERE flags.fid = submissions.fid) >= max_submissions
-        """, (flag,)).fetchone()
-        if is_oversubscribed and not force:
-            r8.log(ip, "flag-err-used", flag, uid=user, cid=cid)
-            raise ValueError("Flag already used too often.")
-
-        r8.log(ip, "flag-submit", flag, uid=user, cid=cid)
-        r8.db.execute("""
-          INSERT INTO submissions (uid, fid) VALUES (?, ?)
-        """, (user, flag))
-        on_submit.send(user=user, cid=cid)
+    cid, error = _submit_flag(r8.db, flag, user, get_ip(ip), force)
+    if error:
+        raise ValueError(error)
+    on_submit.send(user=user, cid=cid)
+    return cid
+
+
+async def submit_flag_async(
+        flag: str,
+        user: str,
+        ip: THasIP,
+        force: bool = False
+) -> str:
+    """Like :func:`submit_flag`, but does not block the event loop."""
+    # aiosqlite can only run single statements, so we run the whole transaction on its worker thread.
+    # This way there is no await between our checks and the insert.
+    cid, error = await r8.db_async._execute(_submit_flag, r8.db_async._conn, flag, user, get_ip(ip), force)
+    if error:
+        raise ValueError(error)
+    on_submit.send(user=user, cid=cid)
     return cid
 
 
+_get_challenges_query = """
+    WITH teammates(uid) AS (
+        SELECT uid FROM teams WHERE tid = (SELECT tid FROM teams WHERE uid = ?)
+    ),
+    solves AS (
+        SELECT cid, COUNT(*) AS solves
+        FROM submissions
+        NATURAL JOIN flags
+        GROUP BY cid
+    ),
+    solve_time AS (
+        SELECT cid, MAX(timestamp) AS solve_time
+        FROM submissions
+        NATURAL JOIN flags
+        NATURAL JOIN challenges
+        WHERE (
+            uid = ? OR
+            team = 1 AND submissions.uid IN teammates
+        )
+        GROUP BY cid
+    ),
+    -- this should really be done with a window function (row_number() OVER (PARTITION BY cid ORDER BY timestamp)),
+    -- but that only works in SQLite 3.25, which will only be available in Ubuntu 20.04+.
+    solve_rank AS (
+        SELECT cid, COUNT(*) AS solve_rank
+        FROM submissions
+        NATURAL JOIN flags
+        NATURAL JOIN solve_time
+        WHERE timestamp <= solve_time
+        GROUP BY cid
+    )
+    SELECT
+        cid,
+        CAST(strftime('%s',t_start) AS INTEGER) AS start,
+        CAST(strftime('%s',t_stop) AS INTEGER) AS stop,
+        CAST(strftime('%s',solve_time) AS INTEGER) AS solve_time,
+        solve_rank,
+        IFNULL(solves, 0) as solves,
+        team
+    FROM challenges
+    NATURAL LEFT JOIN solve_time
+    NATURAL LEFT JOIN solve_rank
+    NATURAL LEFT JOIN solves
+    WHERE t_start < datetime('now')  -- hide not yet active challenges
+"""
+
+
 async def get_challenges(user: str):
     """Get challenges to display for a specific user"""
-    with r8.db:
-        cursor = r8.db.execute("""
-            WITH solves AS (
-                SELECT cid, COUNT(*) AS solves
-                FROM submissions
-                NATURAL JOIN flags
-                GROUP BY cid
-            ),
-            solve_time AS (
-                SELECT cid, MAX(timestamp) AS solve_time
-                FROM submissions
-                NATURAL JOIN flags
-                NATURAL JOIN challenges
-                WHERE (
-                    uid = ? OR
-                    team = 1 AND submissions.uid IN (SELECT uid FROM teams WHERE tid = (SELECT tid FROM teams WHERE uid = ?))
-                )
-                GROUP BY cid
-            ),
-            -- this should really be done with a window function (row_number() OVER (PARTITION BY cid ORDER BY timestamp)),
-            -- but that only works in SQLite 3.25, which will only be available in Ubuntu 20.04+.
-            solve_rank AS (
-                SELECT cid, COUNT(*) AS solve_rank
-                FROM submissions
-                NATURAL JOIN flags
-                NATURAL JOIN solve_time
-                WHERE timestamp <= solve_time
-                GROUP BY cid
-            )
-            SELECT
-                cid,
-                CAST(strftime('%s',t_start) AS INTEGER) AS start,
-                CAST(strftime('%s',t_stop) AS INTEGER) AS stop,
-                CAST(strftime('%s',solve_time) AS INTEGER) AS solve_time,
-                solve_rank,
-                IFNULL(solves, 0) as solves,
-                team
-            FROM challenges
-            NATURAL LEFT JOIN solve_time
-            NATURAL LEFT JOIN solve_rank
-            NATURAL LEFT JOIN solves
-            WHERE t_start < datetime('now')  -- hide not yet active challenges
-        """, (user, user))
+    async with read_connection() as db, db.execute(_get_challenges_query, (user, user)) as cursor:
         column_names = tuple(x[0] for x in cursor.description)
         results = [
             {
                 key: value
                 for key, value in zip(column_names, row)
-            } for row in cursor.fetchall()
+            } for row in await cursor.fetchall()
         ]
     results = [
         x for x in results
@@ -49,6 +49,7 @@ setup(
         "argon2_cffi",
         "aiohttp",
         "aiohttp_jinja2",
+        "aiosqlite",
         "itsdangerous",
         "blinker",
     ],
@@ -46,6 +46,35 @@ def test_flags(r8cli):
     r8cli("flags delete foo")
 
 
+def test_submit_flag(r8cli):
+    r8cli([
+        "sql", "stmt", "--no-backup",
+        "INSERT INTO challenges (cid, team, t_start, t_stop) "
+        "VALUES ('Basic(team)', 1, datetime('now'), datetime('now','+1 day'))"
+    ])
+    r8cli("flags create Basic(team) __flag__{0123456789abcdef0123456789abcdef} --max 1")
+    r8cli("flags create Basic(team) team-flag --max 5")
+    r8cli("flags create Basic(expired) expired-flag --max 5")
+
+    with pytest.raises(RuntimeError, match="Unknown user"):
+        r8cli("flags submit team-flag nobody")
+    with pytest.raises(RuntimeError, match="Unknown Flag"):
+        r8cli("flags submit unknown-flag user1")
+    with pytest.raises(RuntimeError, match="Challenge is not active"):
+        r8cli("flags submit expired-flag user1")
+    assert "Solved Basic(expired)" in r8cli("flags submit --force expired-flag user1").output
+
+    # misformatted flags are corrected
+    assert "Solved Basic(team)" in r8cli(["flags", "submit", "0123456789ABCDEF 0123456789ABCDEF", "user1"]).output
+    # user2 is in the same team
+    with pytest.raises(RuntimeError, match="Challenge already solved"):
+        r8cli("flags submit team-flag user2")
+    # user3 is not, but the flag has been used up.
+    with pytest.raises(RuntimeError, match="Flag already used too often"):
+        r8cli("flags submit __flag__{0123456789abcdef0123456789abcdef} user3")
+    assert "Solved Basic(team)" in r8cli("flags submit team-flag user3").output
+
+
 def test_password(r8cli):
     assert "$argon2id$" in r8cli("password generate").output
     assert "$argon2id$" in r8cli("password hash --password foo").output
@@ -0,0 +1,146 @@
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from click.testing import CliRunner
+
+import r8.cli
+from r8 import server, util
+from r8.challenge import _Challenges
+
+here: Path = Path(__file__).parent
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # r8 keeps its state in module globals, make sure they are restored after the test.
+    monkeypatch.setattr(r8, "db", None, raising=False)
+    monkeypatch.setattr(r8, "db_async", None, raising=False)
+    monkeypatch.setattr(r8, "settings", {}, raising=False)
+    # Run against a separate challenge registry so that challenge classes and instances don't leak into
+    # other tests. Builtin challenges are registered on import, so we don't load entry points.
+    registry = _Challenges()
+    monkeypatch.setattr(r8.challenge, "challenges", registry)
+    monkeypatch.setattr(r8, "challenges", registry)
+    monkeypatch.setattr(r8.challenge.pkg_resources, "iter_entry_points", lambda group: [])
+
+    class Basic(r8.Challenge):
+        @property
+        def title(self) -> str:
+            return self.args
+
+    runner = CliRunner()
+    for command in [
+        "sql init --origin http://localhost:8000",
+        ["sql", "file", "--no-backup", str((here / "test.sql").absolute())],
+    ]:
+        result = runner.invoke(r8.cli.main, command, catch_exceptions=False)
+        assert result.exit_code == 0, result.output
+
+    r8.db = util.sqlite3_connect("r8.db")
+    r8.settings = {
+        k: json.loads(v)
+        for k, v in r8.db.execute("SELECT key, value FROM settings").fetchall()
+    }
+    r8.challenges.load()
+    with r8.db:
+        # challenges are only listed once t_start has passed, so don't start within the current second.
+        r8.db.execute("UPDATE challenges SET t_start = datetime('now', '-1 minute') WHERE cid = 'Basic(active)'")
+    util.create_flag("Basic(active)", 1, "active")
+    util.create_flag("Basic(expired)", 1, "expired")
+    yield
+    r8.db.close()
+    util.auth_token.cache_clear()
+    util._url_for.cache_clear()
+
+
+async def check_login(client: TestClient):
+    resp = await client.post("/api/auth/login", json={"username": "user1", "password": "test"})
+    assert resp.status == 200
+    assert "token" in resp.cookies
+    resp = await client.post("/api/auth/login", json={"username": "user1", "password": "wrong"})
+    assert resp.status == 401
+    resp = await client.post("/api/auth/login", json={"username": "unknown", "password": "test"})
+    assert resp.status == 401
+    resp = await client.post("/api/auth/login", json={"username": "user1"})
+    assert resp.status == 400
+    client.session.cookie_jar.clear()
+
+
+async def check_challenges(client: TestClient):
+    token = {"token": util.auth_token("user1")}
+
+    resp = await client.get("/api/challenges/")
+    assert resp.status == 401
+
+    resp = await client.get("/api/challenges/", params=token)
+    assert resp.status == 200
+    data = await resp.json()
+    assert data["team"] == "team1"
+    assert {x["cid"] for x in data["challenges"]} == {"Basic(expired)", "Basic(solved)", "Basic(active)"}
+
+    async def submit(flag):
+        return await client.post("/api/challenges/submit", params=token, json={"flag": flag})
+
+    resp = await submit("active")
+    assert resp.status == 200
+    data = await resp.json()
+    assert data["solved"] == "active"
+    assert next(x for x in data["challenges"] if x["cid"] == "Basic(active)")["solve_time"]
+    assert await util.has_solved_async("user1", "Basic(active)")
+
+    resp = await submit("active")
+    assert resp.status == 400
+    assert resp.reason == "Challenge already solved."
+    resp = await submit("expired")
+    assert resp.status == 400
+    assert resp.reason == "Challenge is not active."
+    resp = await submit("unknown")
+    assert resp.status == 400
+    assert resp.reason.startswith("Unknown Flag")
+
+    events = r8.db.execute("SELECT type FROM events WHERE uid = 'user1' ORDER BY rowid").fetchall()
+    assert [x[0] for x in events][-5:] == [
+        "get-challenges", "flag-submit", "flag-err-solved", "flag-err-inactive", "flag-err-unknown"
+    ]
+
+
+async def check_register(client: TestClient):
+    r8.settings["register"] = True
+
+    async def register(username, nickname):
+        return await client.post("/api/auth/register", json={
+            "username": username,
+            "password": "test",
+            "nickname": nickname,
+        })
+
+    resps = await asyncio.gather(
+        register("a@x", "dupteam"),
+        register("b@x", "dupteam"),
+        register("c@x", "other"),
+        register("c@x", "another"),
+    )
+    assert sorted(x.status for x in resps) == [200, 200, 400, 400]
+    assert r8.db.execute("SELECT COUNT(*) FROM teams WHERE tid = 'dupteam'").fetchone()[0] == 1
+    assert r8.db.execute("SELECT COUNT(*) FROM users WHERE uid = 'c@x'").fetchone()[0] == 1
+
+    resp = await register("user1", "new-team")
+    assert resp.status == 400
+    assert resp.reason == "There already exists an account with this email."
+    client.session.cookie_jar.clear()
+
+
+def test_server(database):
+    # The REST API sub-applications are module-level singletons and can only be mounted once,
+    # so we exercise everything with a single app instance.
+    async def main():
+        async with TestClient(TestServer(server.make_app())) as client:
+            await check_login(client)
+            await check_challenges(client)
+            await check_register(client)
+
+    asyncio.run(main())
@@ -0,0 +1,16 @@
+from r8.util import correct_flag, hash_password, verify_hash
+
+
+def test_correct_flag():
+    flag = "__flag__{0123456789abcdef0123456789abcdef}"
+    assert correct_flag(flag) == flag
+    assert correct_flag("0123456789ABCDEF 0123456789ABCDEF") == flag
+    assert correct_flag("flag: 0123456789abcdef0123456789abcdef.") == flag
+    assert correct_flag("not a flag") == "not a flag"
+
+
+def test_verify_hash():
+    h = hash_password("foo")
+    assert verify_hash(h, "foo")
+    assert not verify_hash(h, "bar")
+    assert not verify_hash(None, "foo")